@@ -32,9 +32,9 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
 
-    @admin.display(description='Избранное')
+    @admin.display(description='Избранное', ordering='favorites_count')
     def in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(RecipeIngredient)
@@ -1,6 +1,14 @@
+import django
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if django.VERSION < (4, 1):
+            from .db import schedule_health_checks
+            request_started.connect(schedule_health_checks)
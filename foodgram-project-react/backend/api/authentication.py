@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_LENGTH = 40
+
+
+def token_cache_key(key):
+    return f'auth:token:{key}'
+
+
+def forget_tokens(*keys):
+    """Удаляет токены из кеша после коммита, как bump_version: иначе
+    запрос до коммита снова положил бы в кеш старую строку, например
+    пользователя с is_active=True."""
+    cache_keys = [token_cache_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который держит токен вместе с пользователем
+    в кеше AUTH_TOKEN_CACHE_TIMEOUT секунд вместо запроса на каждый вызов.
+
+    Кеш сбрасывается в api.signals при удалении токена (logout) и при
+    сохранении пользователя, в том числе после смены пароля. Работает
+    только с кешем, общим для воркеров (settings.SHARED_CACHE).
+    """
+
+    def authenticate_credentials(self, key):
+        # чужие строки в кеш не пускаем: ключ memcached ограничен
+        if len(key) != TOKEN_LENGTH or not key.isalnum():
+            return super().authenticate_credentials(key)
+        token = cache.get(token_cache_key(key))
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                token_cache_key(key), token,
+                settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+        elif not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
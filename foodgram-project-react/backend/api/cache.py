@@ -0,0 +1,173 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+from users.models import Subscribe
+
+from .renderers import FastJSONRenderer
+from .utils import is_number
+
+# поля ответа рецепта, которые зависят от пользователя или меняются без
+# сохранения рецепта; в кеше они не используются
+RECIPE_STATE_FIELDS = (
+    'is_favorited', 'is_in_shopping_cart', 'is_subscribed', 'favorites_count'
+)
+
+
+def version_key(name):
+    return f'reference:{name}:version'
+
+
+def get_version(name):
+    """Версия справочника; начальное значение — время, а не 1, чтобы
+    после очистки кеша версии не повторялись."""
+    version = cache.get(version_key(name))
+    if version is None:
+        cache.add(version_key(name), time.time_ns(), timeout=None)
+        version = cache.get(version_key(name))
+    return version
+
+
+def bump_version(name):
+    """Меняет версию после коммита, как forget_recipes: иначе ответ,
+    собранный параллельным запросом по старым строкам, попал бы в кеш
+    под новой версией."""
+    transaction.on_commit(
+        lambda: cache.set(version_key(name), time.time_ns(), timeout=None)
+    )
+
+
+class CachedReferenceMixin:
+    """Отдает list/retrieve справочника готовым JSON из кеша с ETag.
+
+    Кеш сбрасывается сменой версии в сигналах модели (api.signals). Без
+    общего кеша (SHARED_CACHE) ответ собирается каждый раз: сброс версии
+    в одном воркере другие бы не увидели. ETag при этом остается.
+    """
+    reference_name = None
+
+    def render(self, get_data):
+        content = FastJSONRenderer().render(get_data())
+        return f'"{hashlib.md5(content).hexdigest()}"', content
+
+    def cached_response(self, request, get_data):
+        if settings.SHARED_CACHE:
+            # путь с параметрами может не влезть в ключ memcached
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            version = get_version(self.reference_name)
+            key = f'reference:{self.reference_name}:{version}:{path}'
+            cached = cache.get(key)
+            if cached is None:
+                cached = self.render(get_data)
+                cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        else:
+            cached = self.render(get_data)
+        etag, content = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.REFERENCE_CACHE_MAX_AGE
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        view = super().list
+        return self.cached_response(
+            request, lambda: view(request, *args, **kwargs).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        view = super().retrieve
+        return self.cached_response(
+            request, lambda: view(request, *args, **kwargs).data
+        )
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe:{recipe_id}:version'
+
+
+def get_recipe_version(recipe_id):
+    key = recipe_version_key(recipe_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), settings.RECIPE_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def forget_recipes(recipe_ids):
+    """Сбрасывает закешированные рецепты сменой их версий.
+
+    Версия меняется после коммита: ответ, собранный по старым данным
+    до коммита, останется под старой версией и читаться не будет.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    transaction.on_commit(lambda: cache.set_many(
+        {
+            recipe_version_key(recipe_id): time.time_ns()
+            for recipe_id in recipe_ids
+        },
+        settings.RECIPE_CACHE_TIMEOUT
+    ))
+
+
+class CachedRecipeMixin:
+    """Хранит retrieve рецепта в кеше готовым JSON.
+
+    Автор, теги и ингредиенты берутся из кеша, а RECIPE_STATE_FIELDS —
+    одним запросом на каждый ответ. Ключ включает адрес сайта, потому что
+    ссылки на картинки абсолютные. Кеш сбрасывается forget_recipes
+    в сигналах рецепта, ингредиентов, тегов и автора (api.signals).
+    Без общего кеша (SHARED_CACHE) выключен, как у справочников.
+    """
+
+    def recipe_state(self, pk):
+        user = self.request.user
+        is_subscribed = Value(False)
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author')
+            ))
+        state = self.get_queryset().prefetch_related(None).filter(
+            pk=pk
+        ).annotate(is_subscribed=is_subscribed).values(
+            *RECIPE_STATE_FIELDS
+        ).first()
+        if state is None:
+            raise Http404
+        return state
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        # «²» и «٣» в ключ кеша не пускаем, их разберет get_object
+        if not settings.SHARED_CACHE or not is_number(str(pk)):
+            return super().retrieve(request, *args, **kwargs)
+        key = (
+            f'recipe:{pk}:{get_recipe_version(pk)}:'
+            f'{request.scheme}://{request.get_host()}'
+        )
+        content = cache.get(key)
+        if content is None:
+            response = super().retrieve(request, *args, **kwargs)
+            cache.set(
+                key, FastJSONRenderer().render(response.data),
+                settings.RECIPE_CACHE_TIMEOUT
+            )
+            return response
+        state = self.recipe_state(pk)
+        data = json.loads(content)
+        data['author']['is_subscribed'] = state.pop('is_subscribed')
+        data.update(state)
+        return Response(data)
@@ -0,0 +1,38 @@
+from functools import wraps
+
+from django.db import connections
+
+
+def check_on_first_cursor(connection):
+    """Оборачивает ensure_connection: проверка выполняется при первом
+    курсоре после начала запроса, как в Django 4.1."""
+    ensure_connection = connection.ensure_connection
+
+    @wraps(ensure_connection)
+    def wrapper():
+        if connection.health_check_pending:
+            connection.health_check_pending = False
+            if (
+                connection.connection is not None
+                and not connection.is_usable()
+            ):
+                connection.close()
+        ensure_connection()
+
+    connection.ensure_connection = wrapper
+
+
+def schedule_health_checks(**kwargs):
+    """Перед запросом отмечает постоянные соединения для проверки.
+
+    Замена CONN_HEALTH_CHECKS, который появился только в Django 4.1:
+    без проверки первый запрос после рестарта БД или pgbouncer падает.
+    SELECT 1 выполняется только перед первым обращением к БД, ответы из
+    кеша и 304 его не делают.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not hasattr(connection, 'health_check_pending'):
+            check_on_first_cursor(connection)
+        connection.health_check_pending = True
@@ -0,0 +1,83 @@
+import base64
+import binascii
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from .images import prepare_image_in_pool, variant_name
+
+
+def image_url(name, variant, request=None):
+    url = default_storage.url(variant_name(name, variant))
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class RecipeImageField(serializers.Field):
+    """Картинка рецепта: на входе base64, на выходе ссылка на вариант.
+
+    Декодирование и сжатие выполняются в пуле потоков, запись файлов —
+    в сериализаторе после успешной валидации (см. images.save_image).
+    """
+    default_error_messages = {
+        'invalid': 'Загрузите изображение в формате base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'too_large': 'Изображение слишком большое.',
+        'timeout': 'Не удалось обработать изображение, попробуйте еще раз.',
+    }
+
+    def __init__(self, variant='full', **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        # фронтенд при редактировании присылает ссылку на старую картинку;
+        # при создании картинки еще нет, и ссылка — ошибка
+        if isinstance(data, str) and data.startswith('http'):
+            if getattr(self.parent, 'instance', None) is None:
+                self.fail('invalid')
+            raise SkipField()
+        if not isinstance(data, str) or ';base64,' not in data:
+            self.fail('invalid')
+        try:
+            content = base64.b64decode(
+                data.split(';base64,', 1)[1], validate=True
+            )
+        except (binascii.Error, ValueError):
+            self.fail('invalid')
+        if len(content) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large')
+        try:
+            return prepare_image_in_pool(content)
+        except ValueError:
+            self.fail('invalid_image')
+        except TimeoutError:
+            self.fail('timeout')
+
+    def get_url(self, value, variant):
+        return image_url(value.name, variant, self.context.get('request'))
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.get_url(value, self.variant)
+
+
+class RecipeImageVariantsField(RecipeImageField):
+    """Ссылки на все размеры картинки рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return {
+            variant: self.get_url(value, variant)
+            for variant in settings.RECIPE_IMAGE_VARIANTS
+        }
@@ -1,30 +1,55 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from .models import Recipe, Tag
+from .models import Cart, Favorite, Recipe, Tag
+from .search import search_recipes
 
 
+# фильтры через EXISTS (semi-join), а не join: строки рецептов не
+# дублируются и DISTINCT не нужен; подзапросы покрываются уникальными
+# индексами (recipe_id, tag_id), (user_id, recipe_id) из ограничений
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='tags_filter'
     )
     is_favorited = filters.BooleanFilter(method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    search = filters.CharFilter(method='search_filter')
+
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag__in=value
+            )
+        ))
 
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_recipe__user=user)
+            return queryset.filter(Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
+    def search_filter(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
@@ -0,0 +1,88 @@
+import hashlib
+import io
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+UPLOAD_TO = 'recipe_images/'
+VARIANT_NAME = re.compile(
+    rf'^(?P<prefix>{UPLOAD_TO}[0-9a-f]{{20}})_full\.jpg$'
+)
+
+PreparedImage = namedtuple('PreparedImage', ['digest', 'variants'])
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='recipe-image'
+)
+
+
+def to_rgb(image):
+    """JPEG не хранит прозрачность: подкладываем белый фон."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def prepare_image(content):
+    """Проверяет картинку и готовит сжатые варианты всех размеров.
+
+    Работает в пуле потоков, ничего не пишет в хранилище.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+        image = Image.open(io.BytesIO(content))
+        image = to_rgb(ImageOps.exif_transpose(image))
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise ValueError('Некорректное изображение.') from error
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(
+            buffer,
+            'JPEG',
+            quality=settings.RECIPE_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True
+        )
+        variants[variant] = buffer.getvalue()
+    return PreparedImage(
+        hashlib.sha256(content).hexdigest()[:20], variants
+    )
+
+
+def prepare_image_in_pool(content):
+    return executor.submit(prepare_image, content).result(
+        timeout=settings.RECIPE_IMAGE_TIMEOUT
+    )
+
+
+def save_image(prepared):
+    """Сохраняет варианты под именами из хеша содержимого.
+
+    Повторная загрузка той же картинки переиспользует готовые файлы.
+    Возвращает имя полноразмерного варианта для Recipe.image.
+    """
+    for variant, data in prepared.variants.items():
+        name = f'{UPLOAD_TO}{prepared.digest}_{variant}.jpg'
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+    return f'{UPLOAD_TO}{prepared.digest}_full.jpg'
+
+
+def variant_name(name, variant):
+    """Имя файла нужного размера; старые картинки отдаются как есть."""
+    match = VARIANT_NAME.match(name)
+    if match is None:
+        return name
+    return f'{match.group("prefix")}_{variant}.jpg'
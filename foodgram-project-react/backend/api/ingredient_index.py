@@ -0,0 +1,98 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Сбрасывается сигналами модели Ingredient в этом процессе, а в
+    остальных воркерах — по истечении INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._built_at = 0
+
+    def invalidate(self):
+        """Сбрасывает индекс после коммита: иначе другой поток процесса
+        успел бы собрать его заново по данным до коммита."""
+        transaction.on_commit(self._reset)
+
+    def _reset(self):
+        self._data = None
+
+    def _is_stale(self):
+        return (
+            self._data is None
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        # все названия одной строкой: поиск подстроки через str.find
+        # быстрее, чем проверка каждого названия в цикле
+        text = '\n'.join(keys)
+        starts = []
+        position = 0
+        for key in keys:
+            starts.append(position)
+            position += len(key) + 1
+        self._data = keys, items, text, starts
+        self._built_at = time.monotonic()
+        return self._data
+
+    def _get(self):
+        data = self._data
+        if data is None or self._is_stale():
+            with self._lock:
+                data = self._data
+                if data is None or self._is_stale():
+                    data = self._build()
+        return data
+
+    def search(self, query='', limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        keys, items, text, starts = self._get()
+        query = query.casefold().strip()
+        if not query:
+            return items[:limit]
+        if '\n' in query:
+            return []
+        result = []
+        start = bisect_left(keys, query)
+        for index in range(start, len(keys)):
+            if not keys[index].startswith(query):
+                break
+            if len(result) == limit:
+                return result
+            result.append(items[index])
+        position = text.find(query)
+        while position != -1 and len(result) != limit:
+            index = bisect_right(starts, position) - 1
+            if not keys[index].startswith(query):
+                result.append(items[index])
+            if index + 1 == len(starts):
+                break
+            position = text.find(query, starts[index + 1])
+        return result
+
+
+ingredient_index = IngredientIndex()
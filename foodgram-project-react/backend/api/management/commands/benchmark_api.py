@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+ENDPOINTS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/recipes/download_shopping_cart/',
+    '/api/recipes/shopping_list/',
+)
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'api.json')
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку и число SQL-запросов основных эндпоинтов через '
+        'тестовый клиент Django (без сети) на текущей базе, например после '
+        'seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Сохранить результат как новый baseline.'
+        )
+
+    def get_client(self):
+        user = User.objects.annotate(
+            subscriptions=Count('subscriber', distinct=True),
+            cart=Count('shopping_user', distinct=True)
+        ).filter(subscriptions__gt=0, cart__gt=0).order_by(
+            '-subscriptions'
+        ).first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с подписками и корзиной, '
+                'сначала выполните seed_data.'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def measure(self, client, url, count):
+        timings, queries = [], []
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: статус {response.status_code}')
+            queries.append(len(context.captured_queries))
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        client = self.get_client()
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        results = {}
+        self.stdout.write(
+            f'{"эндпоинт":<45}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>6}'
+            f'{"Δp50":>9}'
+        )
+        for url in ENDPOINTS:
+            self.measure(client, url, options['warmup'])
+            result = results[url] = self.measure(
+                client, url, options['requests']
+            )
+            delta = ''
+            if url in baseline:
+                change = result['p50_ms'] / baseline[url]['p50_ms'] - 1
+                delta = f'{change:+.0%}'
+            self.stdout.write(
+                f'{url:<45}{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+                f'{result["p99_ms"]:>9}{result["queries"]:>6}{delta:>9}'
+            )
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Baseline сохранен в {options["baseline"]}.')
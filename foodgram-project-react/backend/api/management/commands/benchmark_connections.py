@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+from api.models import Tag
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку цикла запроса с новым подключением к БД '
+        '(CONN_MAX_AGE = 0) и с постоянным соединением с проверкой '
+        'CONN_HEALTH_CHECKS и без нее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--max-age', type=int, default=60)
+
+    def measure(self, max_age, health_checks, count):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            # те же сигналы, что шлет обработчик запроса Django
+            request_started.send(sender=self.__class__)
+            list(Tag.objects.all()[:1])
+            request_finished.send(sender=self.__class__)
+            timings.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        return timings
+
+    def handle(self, *args, **options):
+        initial = {
+            name: connection.settings_dict.get(name)
+            for name in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')
+        }
+        self.stdout.write(
+            f'{"CONN_MAX_AGE":<14}{"проверка":<10}'
+            f'{"p50":>9}{"p95":>9}{"p99":>9}'
+        )
+        try:
+            for max_age, health_checks in (
+                (0, False),
+                (options['max_age'], True),
+                (options['max_age'], False),
+            ):
+                timings = self.measure(
+                    max_age, health_checks, options['requests']
+                )
+                self.stdout.write(
+                    f'{max_age:<14}{"да" if health_checks else "нет":<10}'
+                    f'{percentile(timings, 50):>9.2f}'
+                    f'{percentile(timings, 95):>9.2f}'
+                    f'{percentile(timings, 99):>9.2f}'
+                )
+        finally:
+            connection.settings_dict.update(initial)
@@ -0,0 +1,38 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from api.ingredient_index import ingredient_index
+from api.models import Ingredient
+from api.serializers import IngredientSerializer
+
+QUERIES = ('а', 'мо', 'сол', 'картоф', 'масло', 'соус', 'я')
+
+
+def db_search(query):
+    return IngredientSerializer(
+        Ingredient.objects.filter(name__istartswith=query), many=True
+    ).data
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск ингредиентов через БД и через индекс в памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        ingredient_index.search('')
+        self.stdout.write(f'{"запрос":<10}{"БД, мкс":>12}{"индекс, мкс":>14}')
+        for query in QUERIES:
+            db_time = timeit.timeit(
+                lambda: db_search(query), number=repeat
+            ) / repeat * 10**6
+            index_time = timeit.timeit(
+                lambda: ingredient_index.search(query, options['limit']),
+                number=repeat
+            ) / repeat * 10**6
+            self.stdout.write(
+                f'{query:<10}{db_time:>12.1f}{index_time:>14.1f}'
+            )
@@ -0,0 +1,74 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.parsers import FastJSONParser, orjson
+from api.renderers import FastJSONRenderer
+from api.views import RecipeViewSet
+
+from .benchmark_api import percentile
+
+PATHS = ('/api/recipes/', '/api/recipes/?limit=100')
+
+
+def measure(func, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000000)
+    return percentile(timings, 50)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer/JSONParser DRF с FastJSONRenderer/'
+        'FastJSONParser на ответах списка рецептов текущей базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def get_data(self, path):
+        response = RecipeViewSet.as_view({'get': 'list'})(
+            APIRequestFactory().get(path)
+        )
+        if not response.data['results']:
+            raise CommandError('Нет рецептов, сначала выполните seed_data.')
+        return response.data
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson не установлен, обе пары на json.')
+        repeat = options['repeat']
+        self.stdout.write(
+            f'{"ответ":<26}{"КБ":>7}{"render, мкс":>16}{"parse, мкс":>16}'
+            f'{"совпадает":>11}'
+        )
+        for path in PATHS:
+            data = self.get_data(path)
+            content = JSONRenderer().render(data)
+            fast_content = FastJSONRenderer().render(data)
+            render = (
+                measure(lambda: JSONRenderer().render(data), repeat),
+                measure(lambda: FastJSONRenderer().render(data), repeat),
+            )
+            parse = (
+                measure(
+                    lambda: JSONParser().parse(io.BytesIO(content)), repeat
+                ),
+                measure(
+                    lambda: FastJSONParser().parse(io.BytesIO(content)),
+                    repeat
+                ),
+            )
+            self.stdout.write(
+                f'{path:<26}{len(content) / 1024:>7.1f}'
+                f'{render[0]:>8.0f}{render[1]:>8.0f}'
+                f'{parse[0]:>8.0f}{parse[1]:>8.0f}'
+                f'{"да" if content == fast_content else "нет":>11}'
+            )
@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from api.models import Ingredient, Recipe
+from api.recipe_matcher import recipe_matcher
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет подбор рецептов по ингредиентам (/api/recipes/match/) '
+        'на текущей базе: построение индекса и первая страница ответа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def measure(self, held, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = recipe_matcher.match(held)
+            result[0:6]
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), max(timings), len(result)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        recipe_matcher.changed()
+        recipe_matcher.match([])
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, индекс построен за '
+            f'{time.perf_counter() - started:.1f} с.'
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        popular = list(Ingredient.objects.annotate(
+            usage=Count('ingredients')
+        ).order_by('-usage').values_list('id', flat=True)[:10])
+        cases = {
+            f'{size} случайных': rng.sample(ingredient_ids, size)
+            for size in (3, 10, 30)
+        }
+        cases['10 самых частых'] = popular
+        self.stdout.write(
+            f'{"ингредиенты":<18}{"p50, мс":>10}{"max, мс":>10}'
+            f'{"рецептов":>10}'
+        )
+        for name, held in cases.items():
+            median, slowest, count = self.measure(held, options['repeat'])
+            self.stdout.write(
+                f'{name:<18}{median:>10.2f}{slowest:>10.2f}{count:>10}'
+            )
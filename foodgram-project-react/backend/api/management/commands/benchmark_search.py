@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from api.models import Recipe, RecipeIngredient
+from api.search import search_recipes, uses_search_vector
+
+QUERIES = ('молоко', 'сахар', 'рецепт описание', 'соль перец')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск рецептов через icontains с полнотекстовым '
+        '?search=. Данные: seed_data --recipes 100000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def naive(self, query):
+        return Recipe.objects.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__name__icontains=query
+            ))
+        ).order_by('-pub_date')
+
+    def measure(self, get_queryset, repeat):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = get_queryset()
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), get_queryset().count()
+
+    def handle(self, *args, **options):
+        backend = 'tsvector' if uses_search_vector() else 'индекс в памяти'
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, поиск: {backend}.'
+        )
+        self.stdout.write(
+            f'{"запрос":<22}{"icontains, мс":>15}{"найдено":>9}'
+            f'{"search, мс":>12}{"найдено":>9}'
+        )
+        # первый вызов строит индекс в памяти, в замер не входит
+        list(search_recipes(Recipe.objects.all(), 'прогрев')[:1])
+        for query in options['queries'] or QUERIES:
+            naive_ms, naive_count = self.measure(
+                lambda: self.naive(query), options['repeat']
+            )
+            search_ms, search_count = self.measure(
+                lambda: search_recipes(Recipe.objects.all(), query),
+                options['repeat']
+            )
+            self.stdout.write(
+                f'{query:<22}{naive_ms:>15.2f}{naive_count:>9}'
+                f'{search_ms:>12.2f}{search_count:>9}'
+            )
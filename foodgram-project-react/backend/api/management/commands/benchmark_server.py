@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_api import percentile
+
+MODES = ('sync', 'gthread', 'asgi')
+PATHS = (
+    '/api/recipes/',
+    '/api/tags/',
+    '/api/ingredients/?name=' + quote('мол'),
+)
+STARTUP_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает gunicorn в режимах sync, gthread и asgi (gunicorn.conf.py) '
+        'и сравнивает пропускную способность под параллельной нагрузкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int,
+                            help='GUNICORN_WORKERS, по умолчанию от CPU.')
+        parser.add_argument('--token',
+                            help='Токен для заголовка Authorization.')
+
+    def start_server(self, mode, options):
+        env = dict(
+            os.environ,
+            GUNICORN_MODE=mode,
+            GUNICORN_BIND=f'127.0.0.1:{options["port"]}',
+            GUNICORN_MAX_REQUESTS='0',
+        )
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'{mode}: gunicorn не запустился.')
+            try:
+                self.fetch(options, PATHS[0])
+                return server
+            except (URLError, ConnectionError):
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(
+            f'{mode}: сервер не ответил за {STARTUP_TIMEOUT} с.'
+        )
+
+    def fetch(self, options, path):
+        request = Request(f'http://127.0.0.1:{options["port"]}{path}')
+        if options['token']:
+            request.add_header('Authorization', f'Token {options["token"]}')
+        started = time.perf_counter()
+        with urlopen(request, timeout=STARTUP_TIMEOUT) as response:
+            response.read()
+        return (time.perf_counter() - started) * 1000
+
+    def run_load(self, options):
+        paths = [
+            PATHS[i % len(PATHS)] for i in range(options['requests'])
+        ]
+        errors = 0
+        timings = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            futures = [
+                executor.submit(self.fetch, options, path) for path in paths
+            ]
+            for future in futures:
+                try:
+                    timings.append(future.result())
+                except (URLError, ConnectionError):
+                    errors += 1
+        elapsed = time.perf_counter() - started
+        return {
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 1) if timings else None,
+            'p95_ms': round(percentile(timings, 95), 1) if timings else None,
+            'errors': errors,
+        }
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"режим":<10}{"rps":>10}{"p50":>10}{"p95":>10}{"ошибки":>8}'
+        )
+        for mode in options['modes']:
+            server = self.start_server(mode, options)
+            try:
+                result = self.run_load(options)
+            finally:
+                server.terminate()
+                server.wait()
+            self.stdout.write(
+                f'{mode:<10}{result["rps"]:>10}{result["p50_ms"]:>10}'
+                f'{result["p95_ms"]:>10}{result["errors"]:>8}'
+            )
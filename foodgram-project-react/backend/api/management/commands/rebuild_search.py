@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.models import Recipe
+from api.search import update_search_vectors
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает search_vector всех рецептов, например после смены '
+        'SEARCH_CONFIG или массового импорта.'
+    )
+
+    def handle(self, *args, **options):
+        pks = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(pks), BATCH_SIZE):
+            update_search_vectors(pks[start:start + BATCH_SIZE])
+        self.stdout.write(f'Обновлено рецептов: {len(pks)}.')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from api.models import Recipe
+from api.utils import favorites_count_subquery
+
+
+class Command(BaseCommand):
+    help = 'Сверяет Recipe.favorites_count с таблицей избранного.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число расхождений.'
+        )
+
+    def handle(self, *args, **options):
+        drifted = Recipe.objects.annotate(
+            actual=favorites_count_subquery()
+        ).exclude(favorites_count=F('actual'))
+        count = drifted.count()
+        if count and not options['dry_run']:
+            Recipe.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update(favorites_count=favorites_count_subquery())
+        self.stdout.write(f'Рецептов с расхождением: {count}.')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from api.models import ShoppingListItem
+from api.shopping_list import cart_totals, refresh_shopping_lists
+from users.models import User
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Сверяет списки покупок с корзинами и пересобирает расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число расхождений.'
+        )
+
+    def drifted_users(self, user_ids):
+        expected = cart_totals(user_ids)
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingListItem.objects.filter(user_id__in=user_ids).values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        return {
+            user_id for (user_id, _), _ in expected.items() ^ actual.items()
+        }
+
+    def handle(self, *args, **options):
+        user_ids = list(User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        drifted = set()
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[start:start + BATCH_SIZE]
+            users = self.drifted_users(batch)
+            if users and not options['dry_run']:
+                refresh_shopping_lists(users)
+            drifted |= users
+        self.stdout.write(f'Пользователей с расхождением: {len(drifted)}.')
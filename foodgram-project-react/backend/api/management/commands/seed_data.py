@@ -0,0 +1,188 @@
+import io
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from api.images import prepare_image, save_image
+from api.models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredient,
+                        Tag)
+from api.recipe_matcher import recipe_matcher
+from api.search import update_search_vectors
+from api.shopping_list import refresh_shopping_lists
+from api.utils import favorites_count_subquery
+from users.models import Subscribe, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BATCH_SIZE = 1000
+
+
+def skewed_choice(rng, items, exponent=1.2):
+    """Выбор с перекосом к началу списка: популярные авторы и рецепты."""
+    return items[min(int(rng.paretovariate(exponent)) - 1, len(items) - 1)]
+
+
+def random_count(rng, mean):
+    """Экспоненциальное распределение: у большинства мало, у немногих много."""
+    return int(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+def skewed_sample(rng, items, count):
+    result = set()
+    for _ in range(count * 3):
+        if len(result) >= min(count, len(items)):
+            break
+        result.add(skewed_choice(rng, items))
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу тестовыми пользователями, рецептами и связями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных на пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), '#E26C2D').save(buffer, 'JPEG')
+        return save_image(prepare_image(buffer.getvalue()))
+
+    def create_users(self, count):
+        offset = User.objects.count()
+        password = make_password('seed-password')
+        User.objects.bulk_create([
+            User(
+                username=f'seed{offset + i}',
+                email=f'seed{offset + i}@example.com',
+                first_name='Тест',
+                last_name=f'Пользователь {offset + i}',
+                password=password
+            ) for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        return list(User.objects.filter(
+            username__startswith='seed'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, rng, count, author_ids):
+        if not Ingredient.objects.exists():
+            call_command('uploadcsv', stdout=self.stdout)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        image = self.placeholder_image()
+        Recipe.objects.bulk_create([
+            Recipe(
+                author_id=skewed_choice(rng, author_ids),
+                name=f'Рецепт {i}',
+                text='Описание рецепта. ' * rng.randint(1, 20),
+                cooking_time=rng.randint(5, 180),
+                image=image
+            ) for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:count])
+        recipe_ingredients = []
+        recipe_tags = []
+        for recipe_id in recipe_ids:
+            for ingredient_id in rng.sample(
+                ingredient_ids, rng.randint(3, 12)
+            ):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500)
+                ))
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids))):
+                recipe_tags.append(Recipe.tags.through(
+                    recipe_id=recipe_id, tag_id=tag_id
+                ))
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=BATCH_SIZE
+        )
+        Recipe.tags.through.objects.bulk_create(
+            recipe_tags, batch_size=BATCH_SIZE
+        )
+        if recipe_ids:
+            update_search_vectors(
+                Recipe.objects.filter(pk__gte=recipe_ids[-1]).values('pk')
+            )
+        recipe_matcher.changed()
+        return recipe_ids, len(recipe_ingredients)
+
+    def create_relations(self, rng, options, user_ids, author_ids, recipe_ids):
+        popular = recipe_ids[:]
+        rng.shuffle(popular)
+        relations = {Favorite: [], Cart: [], Subscribe: []}
+        for user_id in user_ids:
+            for recipe_id in skewed_sample(
+                rng, popular, random_count(rng, options['favorites'])
+            ):
+                relations[Favorite].append(
+                    Favorite(user_id=user_id, recipe_id=recipe_id)
+                )
+            for recipe_id in skewed_sample(
+                rng, popular, random_count(rng, options['cart'])
+            ):
+                relations[Cart].append(
+                    Cart(user_id=user_id, recipe_id=recipe_id)
+                )
+            for author_id in skewed_sample(
+                rng, author_ids, random_count(rng, options['subscriptions'])
+            ):
+                if author_id != user_id:
+                    relations[Subscribe].append(
+                        Subscribe(user_id=user_id, author_id=author_id)
+                    )
+        for model, objects in relations.items():
+            model.objects.bulk_create(
+                objects, batch_size=BATCH_SIZE, ignore_conflicts=True
+            )
+        # bulk_create не отправляет сигналы, счетчики и списки покупок
+        # пересчитываем сами
+        if recipe_ids:
+            Recipe.objects.filter(pk__gte=recipe_ids[-1]).update(
+                favorites_count=favorites_count_subquery()
+            )
+        refresh_shopping_lists(user_ids)
+        return {model: len(objects) for model, objects in relations.items()}
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rng = random.Random(options['seed'])
+        author_ids = self.create_users(options['users'])
+        user_ids = author_ids[len(author_ids) - options['users']:]
+        rng.shuffle(author_ids)
+        recipe_ids, ingredients_count = self.create_recipes(
+            rng, options['recipes'], author_ids
+        )
+        counts = self.create_relations(
+            rng, options, user_ids, author_ids, recipe_ids
+        )
+        self.stdout.write(
+            f'Создано: пользователей {len(user_ids)}, '
+            f'рецептов {len(recipe_ids)}, '
+            f'ингредиентов в рецептах {ingredients_count}, '
+            f'избранного {counts[Favorite]}, корзин {counts[Cart]}, '
+            f'подписок {counts[Subscribe]} '
+            f'за {time.monotonic() - started:.1f} с.'
+        )
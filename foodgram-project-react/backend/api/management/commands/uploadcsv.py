@@ -1,21 +1,87 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from foodgram import settings
+from api.cache import bump_version
 from api.models import Ingredient
 
+HEADER = ['name', 'measurement_unit']
 
-def ingredient_create(row):
-    Ingredient.objects.get_or_create(name=row[0], measurement_unit=row[1])
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row and row != HEADER:
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON, пропуская уже имеющиеся.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'ingredients.csv'),
+            help='Путь к файлу .csv или .json.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать новые ингредиенты, ничего не записывая.'
+        )
+
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, 'ingredients.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader)
-            for row in reader:
-                ingredient_create(row)
-        self.stdout.write("Ингредиенты загружены.")
+        path = options['path']
+        readers = {'.csv': read_csv, '.json': read_json}
+        reader = readers.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        started = time.monotonic()
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        total = created = 0
+        with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+            for chunk in chunks(reader(file), options['batch_size']):
+                total += len(chunk)
+                new = []
+                for pair in chunk:
+                    if pair not in existing:
+                        existing.add(pair)
+                        new.append(pair)
+                created += len(new)
+                if not options['dry_run']:
+                    Ingredient.objects.bulk_create(
+                        [
+                            Ingredient(name=name, measurement_unit=unit)
+                            for name, unit in new
+                        ],
+                        ignore_conflicts=True
+                    )
+        if created and not options['dry_run']:
+            # bulk_create не отправляет post_save
+            bump_version('ingredients')
+        mode = ' (dry run)' if options['dry_run'] else ''
+        self.stdout.write(
+            f'Ингредиенты загружены{mode}: прочитано {total}, '
+            f'новых {created}, пропущено {total - created} '
+            f'за {time.monotonic() - started:.2f} с.'
+        )
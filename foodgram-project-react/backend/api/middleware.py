@@ -0,0 +1,118 @@
+import logging
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# последние запросы процесса, читаются в PerfView (/api/_perf/)
+records = deque(maxlen=settings.PERF_BUFFER_SIZE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """execute_wrapper: считает SQL-запросы и время в БД."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def get_query_budget(view_func, method):
+    """query_budget вьюхи: число или словарь {action: число}."""
+    view_class = getattr(view_func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        return budget.get(actions.get(method.lower()))
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """Замеряет запросы к БД, время и размер ответа для каждой вьюхи.
+
+    serialize_ms — время работы вьюхи за вычетом БД (в DRF это в основном
+    сериализаторы), render_ms — рендеринг ответа в JSON.
+    При PERF_STRICT = True превышение query_budget вьюхи — исключение,
+    иначе предупреждение в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.perf = {'view_started': None, 'view_finished': None,
+                        'render_started': None, 'render_finished': None,
+                        'budget': None, 'view': None}
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        if request.perf['view'] is not None:
+            self.record(request, response, counter, started, finished)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        request.perf['view'] = match.view_name if match else None
+        request.perf['budget'] = get_query_budget(view_func, request.method)
+        request.perf['view_started'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        perf = request.perf
+        perf['view_finished'] = perf['render_started'] = time.perf_counter()
+        response.add_post_render_callback(
+            lambda response: perf.update(render_finished=time.perf_counter())
+        )
+        return response
+
+    def record(self, request, response, counter, started, finished):
+        perf = request.perf
+        view_finished = perf['view_finished'] or finished
+        render_ms = 0
+        if perf['render_finished'] is not None:
+            render_ms = (perf['render_finished'] - perf['render_started'])
+            render_ms *= 1000
+        db_ms = counter.duration * 1000
+        record = {
+            'view': perf['view'],
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': counter.count,
+            'query_budget': perf['budget'],
+            'db_ms': round(db_ms, 2),
+            'serialize_ms': round(max(
+                (view_finished - perf['view_started']) * 1000 - db_ms, 0
+            ), 2),
+            'render_ms': round(render_ms, 2),
+            'total_ms': round((finished - started) * 1000, 2),
+            'size': (
+                None if response.streaming else len(response.content)
+            ),
+            'time': time.time(),
+        }
+        records.append(record)
+        budget = perf['budget']
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{request.method} {perf["view"]}: {counter.count} SQL-'
+                f'запросов при бюджете {budget}'
+            )
+            if settings.PERF_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:35
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# GIN-индекс есть только в PostgreSQL, поэтому его нет в Meta.indexes
+SEARCH_INDEX = GinIndex(
+    fields=['search_vector'], name='recipe_search_vector_idx'
+)
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+    config = settings.SEARCH_CONFIG
+    ingredient_names = Subquery(
+        RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names')
+    )
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(ingredient_names, weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    ))
+    schema_editor.add_index(Recipe, SEARCH_INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('api', 'Recipe'), SEARCH_INDEX
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
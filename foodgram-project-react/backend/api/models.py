@@ -1,9 +1,12 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from django.utils.html import mark_safe
 from foodgram.settings import MEDIA_URL
 from users.models import User
 
+from .images import UPLOAD_TO, variant_name
+
 
 class Tag(models.Model):
     name = models.CharField('Название', max_length=200)
@@ -35,6 +38,11 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_ingredient', fields=['name', 'measurement_unit']
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -54,7 +62,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Картинка',
-        upload_to='recipe_images/'
+        upload_to=UPLOAD_TO
     )
     text = models.TextField(
         'Описание'
@@ -79,18 +87,37 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # поддерживается сигналами Favorite, сверка — reconcile_favorites
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    # название, ингредиенты и описание для ?search=, обновляется в
+    # api.search; GIN-индекс создается миграцией только в PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_favorites_count_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
     def image_tag(self):
+        thumbnail = variant_name(self.image.name, 'thumbnail')
         return mark_safe(
-            f'<img src="{MEDIA_URL}{self.image}" width="99" height="99">'
+            f'<img src="{MEDIA_URL}{thumbnail}" width="99" height="99">'
         )
 
     image_tag.short_description = 'Фото готового блюда'
@@ -178,3 +205,36 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя.
+
+    Поддерживается инкрементально из api.signals, сверяется командой
+    reconcile_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_shopping_list_item', fields=['user', 'ingredient']
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient.name} - {self.amount}'
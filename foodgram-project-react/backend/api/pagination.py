@@ -1,5 +1,79 @@
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipePaginator(CustomPaginator):
+    """Постраничная выдача рецептов с опциональным режимом курсора.
+
+    С параметром ?cursor= страница выбирается по ключу (pub_date, id)
+    без OFFSET и без COUNT(*): ответ содержит только next и results.
+    """
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            pub_date, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def encode_cursor(self, recipe):
+        # быстрый путь списка (recipe_rows) отдает строки values()
+        if isinstance(recipe, dict):
+            pub_date, pk = recipe['pub_date'], recipe['id']
+        else:
+            pub_date, pk = recipe.pub_date, recipe.pk
+        position = f'{pub_date.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+            pub_date, pk = position.split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
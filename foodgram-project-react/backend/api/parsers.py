@@ -0,0 +1,36 @@
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser на orjson для тел запросов в UTF-8.
+
+    Без orjson, в другой кодировке, при STRICT_JSON = False и на теле,
+    которое orjson не разобрал (в том числе ошибочном), работает
+    JSONParser: сообщения об ошибках остаются прежними.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (
+            orjson is None
+            or not self.strict
+            or codecs.lookup(encoding).name != 'utf-8'
+        ):
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(content), media_type, parser_context
+            )
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import RecipeIngredient
+
+VERSION_KEY = 'recipe_matcher:version'
+CHANGE_TIMEOUT = 60 * 60 * 24
+
+
+def change_key(version):
+    return f'recipe_matcher:change:{version}'
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def to_bitmap(positions):
+    """Целое с единицами в позициях positions (по возрастанию)."""
+    data = bytearray(positions[-1] // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def iter_bits(bitmap):
+    """Позиции единичных битов от старших к младшим (новые рецепты)."""
+    while bitmap:
+        position = bitmap.bit_length() - 1
+        yield position
+        bitmap ^= 1 << position
+
+
+class MatchResult:
+    """Ленивая выдача для пагинатора: группы рецептов с одинаковыми
+    (есть, всего) по убыванию покрытия, биты раскрываются только для
+    запрошенной страницы."""
+
+    def __init__(self, groups, recipe_ids, recipe_ingredients, held):
+        self.groups = groups
+        self.recipe_ids = recipe_ids
+        self.recipe_ingredients = recipe_ingredients
+        self.held = held
+        self.count = sum(popcount(bitmap) for *_, bitmap in groups)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, page):
+        skip = page.start or 0
+        needed = (page.stop or self.count) - skip
+        result = []
+        for _, matched, total, bitmap in self.groups:
+            if len(result) == needed:
+                break
+            size = popcount(bitmap)
+            if skip >= size:
+                skip -= size
+                continue
+            for position in iter_bits(bitmap):
+                if skip:
+                    skip -= 1
+                    continue
+                result.append({
+                    'id': self.recipe_ids[position],
+                    'matched': matched,
+                    'total': total,
+                    'coverage': round(matched / total, 4),
+                    'missing_ingredients': [
+                        ingredient_id for ingredient_id
+                        in self.recipe_ingredients[position]
+                        if ingredient_id not in self.held
+                    ],
+                })
+                if len(result) == needed:
+                    break
+        return result
+
+
+class RecipeMatcher:
+    """Инвертированный индекс ингредиент -> битовая карта рецептов.
+
+    Рецепт — бит в целом числе Python, поэтому пересечения и подсчет
+    совпадений по всем рецептам — побитовые операции без GROUP BY.
+    Изменения рецептов пишутся в журнал в кеше (changed), каждый процесс
+    применяет их перед поиском; при пропуске записей в журнале и по
+    истечении RECIPE_MATCHER_TTL индекс строится заново. Журнал виден
+    другим процессам только при SHARED_CACHE, иначе они узнают об
+    изменениях лишь при перестройке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = 0
+        self._version = None
+        self._bitmaps = None
+
+    def changed(self, recipe_ids=None):
+        """Отмечает изменение ингредиентов рецептов; None — все.
+
+        Запись в журнал — после коммита: иначе другой процесс применил бы
+        ее, прочитав ингредиенты до коммита, и не перечитал бы их позже.
+        """
+        if recipe_ids is not None:
+            recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self._log_change(recipe_ids))
+
+    def _log_change(self, recipe_ids):
+        cache.add(VERSION_KEY, 0, timeout=None)
+        version = cache.incr(VERSION_KEY)
+        cache.set(change_key(version), recipe_ids, CHANGE_TIMEOUT)
+
+    def _build(self, version):
+        positions = defaultdict(list)
+        sizes = defaultdict(list)
+        self._positions = {}
+        self._recipe_ids = []
+        self._recipe_ingredients = []
+        rows = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id').iterator(chunk_size=10000)
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            ingredient_ids = tuple(sorted({row[1] for row in group}))
+            position = len(self._recipe_ids)
+            self._positions[recipe_id] = position
+            self._recipe_ids.append(recipe_id)
+            self._recipe_ingredients.append(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                positions[ingredient_id].append(position)
+            sizes[len(ingredient_ids)].append(position)
+        # карты собираются один раз из списков позиций: |= по одному
+        # биту копировал бы длинное целое на каждую строку
+        self._bitmaps = defaultdict(int, {
+            ingredient_id: to_bitmap(items)
+            for ingredient_id, items in positions.items()
+        })
+        self._sizes = defaultdict(int, {
+            size: to_bitmap(items) for size, items in sizes.items()
+        })
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _add(self, recipe_id, ingredient_ids):
+        position = self._positions.get(recipe_id)
+        if position is None:
+            position = len(self._recipe_ids)
+            self._positions[recipe_id] = position
+            self._recipe_ids.append(recipe_id)
+            self._recipe_ingredients.append(())
+        bit = 1 << position
+        for ingredient_id in ingredient_ids:
+            self._bitmaps[ingredient_id] |= bit
+        self._sizes[len(ingredient_ids)] |= bit
+        self._recipe_ingredients[position] = tuple(sorted(ingredient_ids))
+
+    def _remove(self, recipe_id):
+        position = self._positions.get(recipe_id)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        current = self._recipe_ingredients[position]
+        for ingredient_id in current:
+            self._bitmaps[ingredient_id] &= mask
+        self._sizes[len(current)] &= mask
+        self._recipe_ingredients[position] = ()
+
+    def _apply(self, recipe_ids):
+        rows = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            rows[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids:
+            self._remove(recipe_id)
+            if rows[recipe_id]:
+                self._add(recipe_id, rows[recipe_id])
+
+    def _sync(self):
+        version = cache.get(VERSION_KEY, 0)
+        if (
+            self._bitmaps is None
+            or time.monotonic() - self._built_at
+            > settings.RECIPE_MATCHER_TTL
+        ):
+            return self._build(version)
+        if version == self._version:
+            return
+        if version < self._version:
+            # кеш очищен, часть журнала потеряна
+            return self._build(version)
+        keys = [
+            change_key(number)
+            for number in range(self._version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys) or None in changes.values():
+            return self._build(version)
+        self._apply({
+            recipe_id for recipe_ids in changes.values()
+            for recipe_id in recipe_ids
+        })
+        self._version = version
+
+    def _count(self, held):
+        """Побитовый счетчик совпадений: planes[i] — i-й бит числа
+        имеющихся ингредиентов у каждого рецепта."""
+        planes = []
+        for ingredient_id in held:
+            carry = self._bitmaps.get(ingredient_id, 0)
+            for index, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[index], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def _groups(self, planes, most):
+        candidates = 0
+        for plane in planes:
+            candidates |= plane
+        groups = []
+        for matched in range(1, most + 1):
+            exact = candidates
+            for index, plane in enumerate(planes):
+                exact &= plane if matched >> index & 1 else ~plane
+            if not exact:
+                continue
+            for total, bitmap in self._sizes.items():
+                group = exact & bitmap
+                if group:
+                    groups.append((matched / total, matched, total, group))
+        groups.sort(key=lambda group: (-group[0], -group[1]))
+        return groups
+
+    def match(self, ingredient_ids):
+        """Рецепты, где есть хотя бы один из ingredient_ids, по убыванию
+        доли имеющихся ингредиентов, затем числа совпадений."""
+        held = frozenset(ingredient_ids)
+        with self._lock:
+            self._sync()
+            planes = self._count(held)
+            # больше 2 ** len(planes) - 1 совпадений счетчик не хранит
+            groups = self._groups(
+                planes, min(len(held), 2 ** len(planes) - 1)
+            )
+            return MatchResult(
+                groups, self._recipe_ids, self._recipe_ingredients, held
+            )
+
+
+recipe_matcher = RecipeMatcher()
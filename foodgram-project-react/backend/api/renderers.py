@@ -0,0 +1,178 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+from rest_framework import exceptions, negotiation, renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+SHOPPING_CART_TITLE = 'Cписок покупок:'
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer на orjson, если тот установлен.
+
+    С настройками DRF по умолчанию (UNICODE_JSON, COMPACT_JSON) вывод
+    совпадает с JSONRenderer: даты, Decimal и ленивые строки orjson
+    передает кодировщику DRF. Отступы (?indent, браузерный API),
+    ensure_ascii и данные, которые orjson не принимает (целые длиннее
+    64 бит, нестроковые ключи), обрабатывает стандартный json.
+    Расходится только запись float с экспонентой (1e16 вместо 1e+16)
+    и NaN/Infinity: orjson пишет null вместо ошибки.
+    """
+    options = 0 if orjson is None else (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+    default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=self.default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # как JSONRenderer: эти разделители строк ломают JSON внутри <script>
+        return content.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """Базовый класс форматов списка покупок.
+
+    render() нужен только для ошибок (401 и т.п.), сам список
+    отдается потоком через stream().
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset or 'utf-8')
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    def get_filename(self):
+        return f'{os.path.splitext(settings.FILE_NAME)[0]}.{self.format}'
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{SHOPPING_CART_TITLE}\n'
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + '{} - {} {}.'.format(*ingredient)
+            separator = '\n'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единица измерения')
+        )
+        for ingredient in ingredients:
+            yield writer.writerow(ingredient)
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(settings.PDF_FONT_PATH):
+            return 'Helvetica'
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.PDF_FONT_PATH)
+        )
+        return self.font_name
+
+    def stream(self, ingredients):
+        # PDF собирается целиком (нужна таблица xref), поэтому отдаем
+        # его одним куском, но строки читаем из курсора порциями
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        line_height = self.font_size * 1.5
+        y = height - self.margin
+        pdf.setFont(font, self.font_size)
+        pdf.drawString(self.margin, y, SHOPPING_CART_TITLE)
+        for ingredient in ingredients:
+            y -= line_height
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y, '{} - {} {}.'.format(*ingredient)
+            )
+        pdf.save()
+        yield buffer.getvalue()
+
+
+class ShoppingCartContentNegotiation(negotiation.DefaultContentNegotiation):
+    """Без подходящего Accept отдаем формат по умолчанию, а не 406."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except exceptions.NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+SHOPPING_CART_RENDERERS = [
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+]
+if canvas is not None:
+    SHOPPING_CART_RENDERERS.append(PDFShoppingCartRenderer)
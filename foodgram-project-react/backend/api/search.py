@@ -0,0 +1,166 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery, Value,
+                              When)
+
+from .models import Recipe, RecipeIngredient
+
+# веса как у ts_rank по умолчанию: A — название, B — ингредиенты,
+# C — описание
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+TOKEN_RE = re.compile(r'\w+')
+
+
+def uses_search_vector():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold())
+
+
+def ingredient_names():
+    return Subquery(
+        RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names')
+    )
+
+
+def search_vector():
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(ingredient_names(), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """Пересчитывает search_vector рецептов (всех, если recipe_ids None).
+
+    Без PostgreSQL сбрасывает индекс в памяти этого процесса.
+    """
+    if not uses_search_vector():
+        recipe_search_index.invalidate()
+        return
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    recipes.update(search_vector=search_vector())
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс рецептов в памяти для СУБД без tsvector.
+
+    Термин запроса совпадает со словами, которые с него начинаются;
+    ранг — сумма весов полей, где нашелся каждый термин. Сбрасывается
+    в update_search_vectors и по истечении SEARCH_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._data = None
+
+    def _is_stale(self):
+        return (
+            self._data is None
+            or time.monotonic() - self._built_at > settings.SEARCH_INDEX_TTL
+        )
+
+    def _build(self):
+        postings = defaultdict(dict)
+
+        def add(recipe_id, text, weight):
+            for token in tokenize(text):
+                if postings[token].get(recipe_id, 0) < weight:
+                    postings[token][recipe_id] = weight
+
+        for pk, name, text in Recipe.objects.values_list('pk', 'name', 'text'):
+            add(pk, name, WEIGHTS['A'])
+            add(pk, text, WEIGHTS['C'])
+        for recipe_id, name in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            add(recipe_id, name, WEIGHTS['B'])
+        self._data = sorted(postings), dict(postings)
+        self._built_at = time.monotonic()
+        return self._data
+
+    def _get(self):
+        data = self._data
+        if data is None or self._is_stale():
+            with self._lock:
+                data = self._data
+                if data is None or self._is_stale():
+                    data = self._build()
+        return data
+
+    def search(self, query, limit=None):
+        """Список (recipe_id, ранг) по убыванию ранга, все термины
+        запроса должны найтись."""
+        tokens, postings = self._get()
+        ranks = None
+        for term in set(tokenize(query)):
+            matches = {}
+            for index in range(bisect_left(tokens, term), len(tokens)):
+                if not tokens[index].startswith(term):
+                    break
+                for recipe_id, weight in postings[tokens[index]].items():
+                    if matches.get(recipe_id, 0) < weight:
+                        matches[recipe_id] = weight
+            if ranks is None:
+                ranks = matches
+            else:
+                ranks = {
+                    recipe_id: rank + matches[recipe_id]
+                    for recipe_id, rank in ranks.items()
+                    if recipe_id in matches
+                }
+            if not ranks:
+                return []
+        if ranks is None:
+            return []
+        return sorted(ranks.items(), key=lambda item: (-item[1], -item[0]))[
+            :limit
+        ]
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Рецепты по запросу с аннотацией search_rank, по убыванию ранга."""
+    if uses_search_vector():
+        search_query = SearchQuery(
+            query, config=settings.SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date')
+    ranks = recipe_search_index.search(
+        query, limit=settings.SEARCH_FALLBACK_LIMIT
+    )
+    if not ranks:
+        return queryset.none()
+    return queryset.filter(pk__in=[pk for pk, _ in ranks]).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(rank)) for pk, rank in ranks],
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-pub_date')
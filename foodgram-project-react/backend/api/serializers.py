@@ -1,24 +1,45 @@
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 from users.models import Subscribe, User
 
-from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag
+from .fields import RecipeImageField, RecipeImageVariantsField
+from .images import save_image
+from .models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingListItem, Tag)
+from .recipe_matcher import recipe_matcher
+from .search import update_search_vectors
+from .shopping_list import recipe_cart_user_ids, refresh_shopping_lists
+
+
+def subscribed_authors(request):
+    """id авторов, на которых подписан пользователь, — раз за запрос."""
+    if not hasattr(request, 'subscribed_authors'):
+        request.subscribed_authors = set(
+            Subscribe.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request.subscribed_authors
 
 
-class UserReadSerializer(UserSerializer):
-    is_subscribed = serializers.SerializerMethodField()
+class IsSubscribedMixin:
+    """Флаг подписки по множеству авторов, загруженному раз за запрос."""
 
     def get_is_subscribed(self, obj):
-        if (self.context.get('request')
-           and not self.context['request'].user.is_anonymous):
-            return Subscribe.objects.filter(
-                user=self.context['request'].user, author=obj
-            ).exists()
-        return False
+        request = self.context.get('request')
+        if not request or request.user.is_anonymous:
+            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in subscribed_authors(request)
+
+
+class UserReadSerializer(IsSubscribedMixin, UserSerializer):
+    is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -86,37 +107,61 @@ class SetPasswordSerializer(serializers.Serializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(read_only=True)
+    image = RecipeImageField(read_only=True)
+    images = RecipeImageVariantsField(source='image')
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
-class SubscriptionsSerializer(serializers.ModelSerializer):
+class RecipeMatchSerializer(RecipeSerializer):
+    """Рецепт с покрытием имеющимися ингредиентами (RecipeMatcher)."""
+    matched = serializers.IntegerField(read_only=True)
+    total = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched', 'total', 'coverage', 'missing_ingredients'
+        )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class SubscriptionsSerializer(IsSubscribedMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
-    def get_is_subscribed(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and Subscribe.objects.filter(
-                user=self.context['request'].user, author=obj
-            ).exists()
-        )
-
+    # recipes_count и limited_recipes готовит UserViewSet.subscriptions
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            limit = self.context['request'].GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = RecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
@@ -134,7 +179,9 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         )
 
 
-class SubscribeAuthorSerializer(serializers.ModelSerializer):
+class SubscribeAuthorSerializer(
+    IsSubscribedMixin, serializers.ModelSerializer
+):
     email = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
@@ -146,14 +193,6 @@ class SubscribeAuthorSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'errors': 'Ошибка подписки.'})
         return obj
 
-    def get_is_subscribed(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and Subscribe.objects.filter(
-                user=self.context['request'].user, author=obj
-            ).exists()
-        )
-
     def get_recipes_count(self, obj):
         return obj.recipes.count()
 
@@ -193,6 +232,29 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def recipe_read_prefetch():
+    """Связи для RecipeReadSerializer. Порядок тегов и ингредиентов задан
+    явно: без ORDER BY его выбирает план запроса СУБД."""
+    return (
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('recipes', queryset=RecipeIngredient.objects.select_related(
+            'ingredient'
+        ).order_by('id')),
+    )
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserReadSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -201,9 +263,14 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField(read_only=True)
+    images = RecipeImageVariantsField(source='image')
 
+    # флаги аннотируются в RecipeViewSet.get_queryset одним запросом,
+    # отдельный запрос делаем только для объектов без аннотации
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (
             self.context.get('request').user.is_authenticated
             and Favorite.objects.filter(
@@ -212,6 +279,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (
             self.context.get('request').user.is_authenticated
             and Cart.objects.filter(
@@ -230,8 +299,10 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
-            'cooking_time'
+            'cooking_time',
+            'favorites_count'
         )
 
 
@@ -250,7 +321,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     author = UserReadSerializer(read_only=True)
     id = serializers.ReadOnlyField()
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     def validate(self, obj):
         for field in ('name', 'text', 'cooking_time'):
@@ -270,6 +341,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальны.'
             )
+        existing_ids = Ingredient.objects.in_bulk(
+            unique_ingredient_id_list
+        ).keys()
+        missing_ids = unique_ingredient_id_list - existing_ids
+        if missing_ids:
+            raise serializers.ValidationError(
+                {'ingredients': (
+                    'Несуществующие ингредиенты: '
+                    f'{", ".join(map(str, sorted(missing_ids)))}.'
+                )}
+            )
         return obj
 
     @transaction.atomic
@@ -278,39 +360,84 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.bulk_create(
             [RecipeIngredient(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
+        # bulk_create без сигналов, ингредиенты в поиск добавляем сами
+        update_search_vectors([recipe.pk])
+        recipe_matcher.changed([recipe.pk])
 
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        validated_data['image'] = save_image(validated_data['image'])
         recipe = Recipe.objects.create(
             author=self.context['request'].user, **validated_data
         )
         self.tags_and_ingredients_set(recipe, tags, ingredients)
         return recipe
 
+    def tags_update(self, recipe, tags):
+        current = {tag.id for tag in recipe.tags.all()}
+        new = {tag.id for tag in tags}
+        if current - new:
+            recipe.tags.remove(*(current - new))
+        if new - current:
+            recipe.tags.add(*(new - current))
+
+    def ingredients_update(self, recipe, ingredients):
+        """Меняем только отличающиеся строки, а не пересоздаем все."""
+        current = {item.ingredient_id: item for item in recipe.recipes.all()}
+        new = {item['id']: item['amount'] for item in ingredients}
+        removed = current.keys() - new.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id in current.keys() & new.keys():
+            item = current[ingredient_id]
+            if item.amount != new[ingredient_id]:
+                item.amount = new[ingredient_id]
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        added = new.keys() - current.keys()
+        if added:
+            RecipeIngredient.objects.bulk_create(
+                [RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=new[ingredient_id]
+                ) for ingredient_id in added]
+            )
+        # bulk-операции без сигналов, удаленные строки обработал post_delete
+        if added:
+            recipe_matcher.changed([recipe.pk])
+        if changed or added:
+            refresh_shopping_lists(
+                recipe_cart_user_ids(recipe.pk),
+                [item.ingredient_id for item in changed] + list(added)
+            )
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = save_image(validated_data['image'])
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(
-            recipe=instance, ingredient__in=instance.ingredients.all()
-        ).delete()
-        self.tags_and_ingredients_set(instance, tags, ingredients)
+        self.tags_update(instance, validated_data.pop('tags'))
+        self.ingredients_update(instance, validated_data.pop('ingredients'))
         instance.save()
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], *recipe_read_prefetch())
         return RecipeReadSerializer(instance, context=self.context).data
 
     class Meta:
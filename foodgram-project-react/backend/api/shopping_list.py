@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Sum
+from users.models import User
+
+from .models import Cart, RecipeIngredient, ShoppingListItem
+
+
+def cart_totals(user_ids, ingredient_ids=None):
+    """Суммы ингредиентов по корзинам: {(user_id, ingredient_id): amount}."""
+    carts = Cart.objects.filter(user_id__in=user_ids)
+    if ingredient_ids is not None:
+        carts = carts.filter(recipe__recipes__ingredient_id__in=ingredient_ids)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in carts.values(
+            'user_id', 'recipe__recipes__ingredient_id'
+        ).annotate(total=Sum('recipe__recipes__amount')).values_list(
+            'user_id', 'recipe__recipes__ingredient_id', 'total'
+        ).order_by()
+        if ingredient_id is not None
+    }
+
+
+@transaction.atomic
+def refresh_shopping_lists(user_ids, ingredient_ids=None):
+    """Пересчитывает списки покупок пользователей по их корзинам.
+
+    user_ids и ingredient_ids — списки или подзапросы; если ingredient_ids
+    задан, трогаются только строки этих ингредиентов.
+    """
+    # блокировка пользователей сериализует параллельные пересчеты
+    user_ids = list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+    if not user_ids:
+        return
+    totals = cart_totals(user_ids, ingredient_ids)
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    if ingredient_ids is not None:
+        items = items.filter(ingredient_id__in=ingredient_ids)
+    stale, changed = [], []
+    for item in items:
+        total = totals.pop((item.user_id, item.ingredient_id), None)
+        if total is None:
+            stale.append(item.pk)
+        elif total != item.amount:
+            item.amount = total
+            changed.append(item)
+    if stale:
+        ShoppingListItem.objects.filter(pk__in=stale).delete()
+    if changed:
+        ShoppingListItem.objects.bulk_update(changed, ['amount'])
+    if totals:
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            ) for (user_id, ingredient_id), amount in totals.items()
+        ])
+
+
+def recipe_ingredient_ids(recipe_ids):
+    return RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id')
+
+
+def recipe_cart_user_ids(recipe_id):
+    return Cart.objects.filter(recipe_id=recipe_id).values('user_id')
@@ -0,0 +1,134 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import forget_tokens
+from .cache import bump_version, forget_recipes
+from .ingredient_index import ingredient_index
+from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag
+from .recipe_matcher import recipe_matcher
+from .search import update_search_vectors
+from .shopping_list import (recipe_cart_user_ids, recipe_ingredient_ids,
+                            refresh_shopping_lists)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(instance, **kwargs):
+    ingredient_index.invalidate()
+    bump_version('ingredients')
+    if not kwargs.get('created'):
+        recipe_ids = RecipeIngredient.objects.filter(
+            ingredient_id=instance.pk
+        ).values_list('recipe_id', flat=True)
+        update_search_vectors(recipe_ids)
+        forget_recipes(recipe_ids)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version('tags')
+
+
+# после удаления тега связи с рецептами уже не найти
+@receiver([post_save, pre_delete], sender=Tag)
+def forget_tag_recipes(instance, **kwargs):
+    if not kwargs.get('created'):
+        forget_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def forget_retagged_recipes(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        forget_recipes([instance.pk])
+    elif pk_set is None:
+        forget_recipes(instance.recipes.values_list('pk', flat=True))
+    else:
+        forget_recipes(pk_set)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    Recipe.objects.filter(
+        pk=instance.recipe_id, favorites_count__gt=0
+    ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    forget_tokens(instance.key)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_tokens(instance, **kwargs):
+    forget_tokens(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=User)
+def forget_author_recipes(instance, created, update_fields, **kwargs):
+    # вход пользователя сохраняет только last_login
+    if not created and update_fields != {'last_login'}:
+        forget_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Cart)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        refresh_shopping_lists(
+            [instance.user_id], recipe_ingredient_ids([instance.recipe_id])
+        )
+
+
+@receiver(pre_delete, sender=Cart)
+def remember_cart_ingredients(instance, **kwargs):
+    # при удалении рецепта его ингредиенты удаляются раньше post_delete
+    instance.shopping_ingredient_ids = list(
+        recipe_ingredient_ids([instance.recipe_id]).values_list(
+            'ingredient_id', flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Cart)
+def remove_from_shopping_list(instance, **kwargs):
+    refresh_shopping_lists(
+        [instance.user_id], getattr(instance, 'shopping_ingredient_ids', None)
+    )
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_shopping_lists(instance, **kwargs):
+    refresh_shopping_lists(
+        recipe_cart_user_ids(instance.recipe_id), [instance.ingredient_id]
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, **kwargs):
+    update_search_vectors([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def forget_recipe(instance, **kwargs):
+    forget_recipes([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_recipe_indexes(instance, **kwargs):
+    update_search_vectors([instance.recipe_id])
+    recipe_matcher.changed([instance.recipe_id])
+    forget_recipes([instance.recipe_id])
@@ -0,0 +1,522 @@
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete, pre_delete
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from rest_framework.test import (APIClient, APIRequestFactory,
+                                 force_authenticate)
+from users.models import Subscribe, User
+
+from .authentication import CachedTokenAuthentication, token_cache_key
+from .db import schedule_health_checks
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingListItem, Tag)
+from .recipe_matcher import VERSION_KEY, RecipeMatcher
+from .utils import BULK_DELETE_REPLACES
+from .views import RecipeViewSet
+
+
+class RecipeTestData:
+    """Рецепты нескольких авторов с тегами, ингредиентами, избранным,
+    корзиной и подписками читателя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}', email=f'author{number}@test.ru',
+                password='Passw0rd!', first_name='Автор',
+                last_name=str(number)
+            )
+            for number in range(3)
+        ]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@test.ru', password='Passw0rd!',
+            first_name='Читатель', last_name='Тестовый'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color='#E26C2D', slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(6)
+        ]
+        cls.recipes = []
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 3], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10 + number,
+                image='recipe_images/test.png'
+            )
+            recipe.tags.set(cls.tags[:1 + number % 3])
+            for shift in range(3):
+                RecipeIngredient.objects.create(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + shift) % 6],
+                    amount=shift + 1
+                )
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            Cart.objects.create(user=cls.reader, recipe=recipe)
+        for author in cls.authors[:2]:
+            Subscribe.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+
+class RecipeListQueriesTest(RecipeTestData, TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def assert_list_queries(self, client, expected):
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(expected):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        # count, страница, теги, ингредиенты
+        self.assert_list_queries(self.get_client(), 4)
+
+    def test_reader(self):
+        # то же и подписки читателя
+        self.assert_list_queries(self.get_client(self.reader), 5)
+
+    def test_reader_flags(self):
+        favorites = {recipe.pk for recipe in self.recipes[::2]}
+        cart = {recipe.pk for recipe in self.recipes[::3]}
+        response = self.get_client(self.reader).get('/api/recipes/?limit=12')
+        for recipe in response.data['results']:
+            self.assertEqual(recipe['is_favorited'], recipe['id'] in favorites)
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in cart
+            )
+
+
+class SerializerRecipeViewSet(RecipeViewSet):
+    fast_read_actions = ()
+
+
+class RecipeRowsTest(RecipeTestData, TestCase):
+    """Список через RecipeRowsSerializer совпадает с RecipeReadSerializer
+    байт в байт."""
+
+    QUERIES = (
+        '',
+        '?limit=5',
+        '?page=2&limit=5',
+        '?cursor=',
+        '?ordering=-favorites_count',
+        '?is_favorited=1',
+        '?is_in_shopping_cart=1',
+        '?tags=tag1',
+        '?tags=tag0&tags=tag2',
+    )
+
+    def render(self, viewset, path, user):
+        request = APIRequestFactory().get(path)
+        if user is not None:
+            force_authenticate(request, user)
+        response = viewset.as_view({'get': 'list'})(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_content(self):
+        for user in (None, self.reader, self.authors[0]):
+            for query in self.QUERIES:
+                path = f'/api/recipes/{query}'
+                with self.subTest(path=path, user=user):
+                    self.assertEqual(
+                        self.render(RecipeViewSet, path, user),
+                        self.render(SerializerRecipeViewSet, path, user)
+                    )
+
+
+class BulkRelationDeleteTest(RecipeTestData, TestCase):
+    """Пакетное удаление не зависит по числу запросов от числа рецептов."""
+
+    def bulk_delete(self, url, model, expected):
+        recipe_ids = list(model.objects.filter(
+            user=self.reader
+        ).values_list('recipe_id', flat=True))
+        with self.assertNumQueries(expected):
+            response = self.get_client(self.reader).delete(
+                url, {'recipes': recipe_ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['deleted'] * len(recipe_ids)
+        )
+        self.assertFalse(model.objects.filter(user=self.reader).exists())
+
+    def test_replaced_receivers(self):
+        # новый receiver удаления пакетное удаление молча пропустило бы
+        for model, names in BULK_DELETE_REPLACES.items():
+            receivers = {
+                receiver.__name__
+                for signal in (pre_delete, post_delete)
+                for receiver in signal._live_receivers(model)
+            }
+            with self.subTest(model=model.__name__):
+                self.assertEqual(receivers, set(names))
+
+    def test_favorites(self):
+        # savepoint, выборка, удаление, пересчет счетчиков, release
+        self.bulk_delete('/api/recipes/favorite/', Favorite, 5)
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        # то же и один пересчет списка покупок вместо пересчета на рецепт
+        self.bulk_delete('/api/recipes/shopping_cart/', Cart, 10)
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+
+
+class ShoppingCartETagTest(RecipeTestData, TestCase):
+
+    def test_ingredient_rename_changes_etag(self):
+        client = self.get_client(self.reader)
+        url = '/api/recipes/download_shopping_cart/?format=txt'
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        ingredient = self.ingredients[0]
+        ingredient.measurement_unit = 'кг'
+        ingredient.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('кг', b''.join(response.streaming_content).decode())
+
+
+class SubscriptionsTest(RecipeTestData, TestCase):
+
+    def get_subscriptions(self, query):
+        return self.get_client(self.reader).get(
+            '/api/users/subscriptions/', query
+        )
+
+    def test_recipes_limit(self):
+        response = self.get_subscriptions({'recipes_limit': '2'})
+        self.assertEqual(response.status_code, 200)
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], 4)
+
+    def test_invalid_recipes_limit(self):
+        for limit in ('-1', 'a', '²'):
+            with self.subTest(limit=limit):
+                response = self.get_subscriptions({'recipes_limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.json())
+
+
+class IngredientSearchTest(RecipeTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # индекс общий для процесса, а коммитов в TestCase нет
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient_index.invalidate()
+
+    def search(self, query):
+        return self.get_client().get('/api/ingredients/', query)
+
+    def test_invalid_limit(self):
+        for limit in ('-1', 'a', '²'):
+            with self.subTest(limit=limit):
+                response = self.search({'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json())
+
+    def test_invalidated_on_commit(self):
+        self.assertEqual(self.search({'name': 'соль'}).json(), [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+            self.assertEqual(self.search({'name': 'соль'}).json(), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            [item['name'] for item in self.search({'name': 'соль'}).json()],
+            ['соль']
+        )
+
+
+class RecipeImageLinkTest(RecipeTestData, TestCase):
+    """Ссылка вместо base64 допустима только при редактировании."""
+
+    def get_payload(self):
+        return {
+            'name': 'Новый', 'text': 'Описание', 'cooking_time': 5,
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+            'image': 'http://testserver/media/recipe_images/test.png',
+        }
+
+    def test_create_with_link(self):
+        response = self.get_client(self.authors[0]).post(
+            '/api/recipes/', self.get_payload(), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_update_with_link(self):
+        recipe = self.recipes[0]
+        response = self.get_client(recipe.author).patch(
+            f'/api/recipes/{recipe.pk}/', self.get_payload(), format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'recipe_images/test.png')
+
+
+@override_settings(SHARED_CACHE=True)
+class ReferenceCacheTest(RecipeTestData, TestCase):
+    """Версия справочника меняется только после коммита."""
+
+    def test_tag_rename(self):
+        client = self.get_client()
+        etag = client.get('/api/tags/')['ETag']
+        tag = self.tags[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            tag.name = 'Переименованный'
+            tag.save()
+            self.assertEqual(client.get('/api/tags/')['ETag'], etag)
+        for callback in callbacks:
+            callback()
+        response = client.get('/api/tags/')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Переименованный', response.content.decode())
+
+
+class RecipeCacheTest(RecipeTestData, TestCase):
+    """Кеш ответа рецепта работает только с общим кешем."""
+
+    def get_recipe(self, client, recipe):
+        return client.get(f'/api/recipes/{recipe.pk}/').json()
+
+    def test_disabled_without_shared_cache(self):
+        recipe = self.recipes[0]
+        self.get_recipe(self.get_client(), recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(name='Без сигналов')
+        self.assertEqual(
+            self.get_recipe(self.get_client(), recipe)['name'], 'Без сигналов'
+        )
+
+    @override_settings(SHARED_CACHE=True)
+    def test_not_ascii_pk(self):
+        recipe = self.recipes[0]
+        client = self.get_client()
+        self.assertEqual(client.get('/api/recipes/²/').status_code, 404)
+        # int() понимает арабские цифры, но forget_recipes сбрасывает
+        # только ключ с цифрами ASCII
+        url = '/api/recipes/{}/'.format(str(recipe.pk).translate(
+            str.maketrans('0123456789', '٠١٢٣٤٥٦٧٨٩')
+        ))
+        self.assertEqual(client.get(url).json()['name'], recipe.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Переименованный'
+            recipe.save()
+        self.assertEqual(client.get(url).json()['name'], 'Переименованный')
+
+    @override_settings(SHARED_CACHE=True)
+    def test_forget_on_commit(self):
+        recipe = self.recipes[0]
+        client = self.get_client(self.reader)
+        data = self.get_recipe(client, recipe)
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['author']['is_subscribed'])
+        Recipe.objects.filter(pk=recipe.pk).update(name='Без сигналов')
+        # из кеша берется общая часть, состояние читателя — из базы
+        Favorite.objects.filter(user=self.reader, recipe=recipe).delete()
+        data = self.get_recipe(client, recipe)
+        self.assertEqual(data['name'], 'Рецепт 0')
+        self.assertFalse(data['is_favorited'])
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe.name = 'Переименованный'
+            recipe.save()
+            self.assertEqual(
+                self.get_recipe(client, recipe)['name'], 'Рецепт 0'
+            )
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            self.get_recipe(client, recipe)['name'], 'Переименованный'
+        )
+
+
+class RecipeMatchTest(RecipeTestData, TestCase):
+
+    def match(self, ingredients):
+        return self.get_client().get(
+            '/api/recipes/match/', {'ingredients': ingredients}
+        )
+
+    def test_match(self):
+        response = self.match(
+            ','.join(str(ingredient.pk) for ingredient in self.ingredients)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+    def test_invalid_ingredients(self):
+        for ingredients in ('', '1,a', '1,2,²'):
+            with self.subTest(ingredients=ingredients):
+                response = self.match(ingredients)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ingredients', response.json())
+
+
+class RecipeMatcherJournalTest(RecipeTestData, TestCase):
+    """Изменение ингредиентов попадает в журнал индекса после коммита."""
+
+    def matched_ids(self, matcher, ingredient):
+        return [
+            row['id'] for row in matcher.match([ingredient.pk])[:20]
+        ]
+
+    def test_change_logged_on_commit(self):
+        matcher = RecipeMatcher()
+        ingredient = Ingredient.objects.create(
+            name='новый ингредиент', measurement_unit='г'
+        )
+        self.assertEqual(self.matched_ids(matcher, ingredient), [])
+        version = cache.get(VERSION_KEY, 0)
+        recipe = self.recipes[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+            self.assertEqual(cache.get(VERSION_KEY, 0), version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get(VERSION_KEY), version + 1)
+        self.assertEqual(self.matched_ids(matcher, ingredient), [recipe.pk])
+
+
+# на тестовых объемах PostgreSQL по статистике выбирает последовательное
+# чтение или индексы внешних ключей, план там проверять бессмысленно
+@skipUnless(connection.vendor == 'sqlite', 'план проверяется в SQLite')
+class RecipeFilterPlanTest(RecipeTestData, TestCase):
+    """Фильтры по тегам, избранному и корзине — подзапросы EXISTS по
+    уникальным индексам (recipe_id, tag_id) и (user_id, recipe_id)."""
+
+    def unique_index(self, table, columns):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA index_list("{table}")')
+            for _, name, unique, *_ in cursor.fetchall():
+                cursor.execute(f'PRAGMA index_info("{name}")')
+                if unique and [
+                    row[2] for row in cursor.fetchall()
+                ] == columns:
+                    return name
+        self.fail(f'Нет уникального индекса {table} {columns}.')
+
+    def test_plan_uses_unique_indexes(self):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = self.reader
+        queryset = RecipeFilter(
+            {
+                'tags': [self.tags[0].slug, self.tags[1].slug],
+                'is_favorited': '1',
+                'is_in_shopping_cart': '1',
+            },
+            queryset=Recipe.objects.all(),
+            request=request
+        ).qs
+        plan = queryset.explain()
+        for table, columns in (
+            (Recipe.tags.through._meta.db_table, ['recipe_id', 'tag_id']),
+            (Favorite._meta.db_table, ['user_id', 'recipe_id']),
+            (Cart._meta.db_table, ['user_id', 'recipe_id']),
+        ):
+            index = self.unique_index(table, columns)
+            with self.subTest(table=table):
+                self.assertIn(f'USING COVERING INDEX {index}', plan)
+        self.assertEqual(plan.count('SEARCH'), 3, plan)
+
+
+class TokenAuthenticationTest(RecipeTestData, TestCase):
+
+    def test_default_without_shared_cache(self):
+        self.assertEqual(
+            api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+            [TokenAuthentication]
+        )
+
+    def test_cached_token_forgotten_on_delete(self):
+        token = Token.objects.create(user=self.reader)
+        key = token.key
+        authentication = CachedTokenAuthentication()
+        self.assertEqual(
+            authentication.authenticate_credentials(key)[0], self.reader
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(key)
+
+    def test_deactivated_user_forgotten_on_commit(self):
+        token = Token.objects.select_related('user').get(
+            key=Token.objects.create(user=self.reader).key
+        )
+        key = token.key
+        authentication = CachedTokenAuthentication()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.reader.is_active = False
+            self.reader.save()
+            # параллельный запрос до коммита кладет в кеш старую строку
+            cache.set(token_cache_key(key), token)
+        for callback in callbacks:
+            callback()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(key)
+
+
+class HealthCheckTest(TestCase):
+    """Соединение проверяется один раз за запрос и только перед первым
+    обращением к БД."""
+
+    def test_checked_on_first_cursor(self):
+        health_checks = mock.patch.dict(
+            connection.settings_dict, CONN_HEALTH_CHECKS=True
+        )
+        is_usable = mock.patch.object(
+            connection, 'is_usable', return_value=True
+        )
+        with health_checks, is_usable as is_usable:
+            schedule_health_checks()
+            self.assertFalse(is_usable.called)
+            for _ in range(2):
+                Tag.objects.exists()
+            is_usable.assert_called_once_with()
+            schedule_health_checks()
+            Tag.objects.exists()
+            self.assertEqual(is_usable.call_count, 2)
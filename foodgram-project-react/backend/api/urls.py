@@ -12,6 +12,7 @@ router.register(
 )
 
 urlpatterns = [
+    path('_perf/', views.PerfView.as_view(), name='perf'),
     path('', include(router.urls)),
     path(r'auth/', include('djoser.urls.authtoken')),
 ]
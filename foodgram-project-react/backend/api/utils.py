@@ -0,0 +1,76 @@
+import hashlib
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Cart, Favorite, Recipe, ShoppingListItem
+from .shopping_list import recipe_ingredient_ids, refresh_shopping_lists
+
+CHUNK_SIZE = 2000
+
+# receivers api.signals, которые delete_user_recipes заменяет пересчетом
+BULK_DELETE_REPLACES = {
+    Favorite: ('decrement_favorites_count',),
+    Cart: ('remember_cart_ingredients', 'remove_from_shopping_list'),
+}
+
+
+def is_number(value):
+    """Строка из цифр ASCII: isdigit() пропускает и «²», на котором int()
+    падает."""
+    return value.isascii() and value.isdigit()
+
+
+def shopping_cart_ingredients(user):
+    """Готовый список покупок пользователя из ShoppingListItem."""
+    return ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'amount', 'ingredient__measurement_unit'
+    ).order_by('ingredient__name').iterator(chunk_size=CHUNK_SIZE)
+
+
+def shopping_cart_etag(user, file_format):
+    """ETag по содержимому списка покупок: название и единица измерения
+    входят в хеш, чтобы переименование ингредиента меняло файл."""
+    rows = ShoppingListItem.objects.filter(user=user).order_by(
+        'ingredient_id'
+    ).values_list(
+        'ingredient_id', 'amount',
+        'ingredient__name', 'ingredient__measurement_unit'
+    )
+    digest = hashlib.md5(file_format.encode())
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        digest.update(('%s:%s:%s:%s;' % row).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def favorites_count_subquery():
+    """Фактическое число добавлений рецепта в избранное."""
+    return Coalesce(Subquery(
+        Favorite.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def delete_user_recipes(model, user, recipe_ids):
+    """Удаляет рецепты recipe_ids из избранного или корзины пользователя
+    одним DELETE и возвращает id удаленных.
+
+    Сигналы pre_delete/post_delete не отправляются: вместо receivers из
+    BULK_DELETE_REPLACES favorites_count пересчитывается одним UPDATE,
+    а список покупок — одним refresh_shopping_lists. На Favorite и Cart
+    никто не ссылается, каскадов нет. Новый receiver удаления этих
+    моделей надо добавить сюда, иначе упадет BulkRelationDeleteTest.
+    """
+    relations = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    deleted = set(relations.values_list('recipe_id', flat=True))
+    if not deleted:
+        return deleted
+    relations._raw_delete(relations.db)
+    if model is Favorite:
+        Recipe.objects.filter(pk__in=deleted).update(
+            favorites_count=favorites_count_subquery()
+        )
+    elif model is Cart:
+        refresh_shopping_lists([user.pk], recipe_ingredient_ids(deleted))
+    return deleted
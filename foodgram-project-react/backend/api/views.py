@@ -1,23 +1,41 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Count, Exists, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
-from foodgram.settings import FILE_NAME
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Subscribe, User
 
+from .cache import CachedRecipeMixin, CachedReferenceMixin
 from .filters import RecipeFilter
-from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag
-from .pagination import CustomPaginator
+from .ingredient_index import ingredient_index
+from .middleware import records
+from .models import (Cart, Favorite, Ingredient, Recipe, ShoppingListItem,
+                     Tag)
+from .pagination import CustomPaginator, RecipePaginator
 from .permissions import IsAuthorOrReadOnly
+from .recipe_matcher import recipe_matcher
+from .recipe_rows import RecipeRowsMixin
+from .renderers import SHOPPING_CART_RENDERERS, ShoppingCartContentNegotiation
 from .serializers import (IngredientSerializer, RecipeCreateSerializer,
+                          RecipeIdsSerializer, RecipeMatchSerializer,
                           RecipeReadSerializer, RecipeSerializer,
-                          SetPasswordSerializer, SubscribeAuthorSerializer,
-                          SubscriptionsSerializer, TagSerializer,
-                          UserCreateSerializer, UserReadSerializer)
+                          SetPasswordSerializer, ShoppingListItemSerializer,
+                          SubscribeAuthorSerializer, SubscriptionsSerializer,
+                          TagSerializer, UserCreateSerializer,
+                          UserReadSerializer, recipe_read_prefetch)
+from .shopping_list import recipe_ingredient_ids, refresh_shopping_lists
+from .utils import (delete_user_recipes, favorites_count_subquery, is_number,
+                    shopping_cart_etag, shopping_cart_ingredients)
 
 
 class GetModelViewSet(
@@ -30,6 +48,7 @@ class GetModelViewSet(
 
 class UserViewSet(GetModelViewSet, mixins.CreateModelMixin):
     queryset = User.objects.all()
+    query_budget = {'list': 4, 'retrieve': 3, 'me': 1, 'subscriptions': 5}
     permission_classes = [AllowAny]
     pagination_class = CustomPaginator
 
@@ -59,7 +78,29 @@ class UserViewSet(GetModelViewSet, mixins.CreateModelMixin):
             permission_classes=[IsAuthenticated],
             pagination_class=CustomPaginator)
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if limit is not None:
+            if not is_number(limit):
+                raise ValidationError(
+                    {'recipes_limit': 'Укажите целое неотрицательное число.'}
+                )
+            # первые N рецептов каждого автора одним запросом; фильтр по
+            # оконной функции появится только в Django 4.2, поэтому
+            # используем коррелированный подзапрос с LIMIT
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(limit)]
+            ))
+        queryset = User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionsSerializer(
             page, many=True, context={'request': request}
@@ -89,35 +130,72 @@ class UserViewSet(GetModelViewSet, mixins.CreateModelMixin):
             )
 
 
-class TagViewSet(GetModelViewSet):
+class TagViewSet(CachedReferenceMixin, GetModelViewSet):
+    reference_name = 'tags'
+    query_budget = 2
     permission_classes = (AllowAny, )
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(GetModelViewSet):
+class IngredientViewSet(CachedReferenceMixin, GetModelViewSet):
+    reference_name = 'ingredients'
+    query_budget = 2
     queryset = Ingredient.objects.all()
     permission_classes = [AllowAny]
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['^name']
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.search(request))
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Recipe.objects
-        .select_related('author')
-        .prefetch_related('ingredients', 'tags')
-        .all()
-    )
-    pagination_class = CustomPaginator
+    def search(self, request):
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not is_number(limit):
+                raise ValidationError(
+                    {'limit': 'Укажите целое неотрицательное число.'}
+                )
+            limit = int(limit)
+        return ingredient_index.search(
+            request.query_params.get('name', ''), limit=limit
+        )
+
+
+class RecipeViewSet(
+    CachedRecipeMixin, RecipeRowsMixin, viewsets.ModelViewSet
+):
+    query_budget = {'list': 8, 'retrieve': 6}
+    fast_read_actions = ('list',)
+    pagination_class = RecipePaginator
     permission_classes = [IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'pub_date')
     http_method_names = ('get', 'post', 'patch', 'create', 'delete')
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = (
+            Recipe.objects
+            .select_related('author')
+            .prefetch_related(*recipe_read_prefetch())
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
@@ -183,29 +261,171 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_204_NO_CONTENT
             )
 
-    @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request, **kwargs):
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_recipe__user=request.user
-            ).values('ingredient').annotate(
-                total_amount=Sum('amount')
-            ).values_list(
-                'ingredient__name',
-                'total_amount',
-                'ingredient__measurement_unit'
+    def bulk_relation(self, request, model, exists_error, missing_error):
+        """Пакетно добавляет или удаляет рецепты в избранном или корзине.
+
+        Возвращает результат по каждому id: added/exists/not_found для
+        POST и deleted/not_found для DELETE.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        relations = model.objects.filter(user=request.user, recipe_id__in=ids)
+        results = []
+        with transaction.atomic():
+            if request.method == 'DELETE':
+                existing = delete_user_recipes(model, request.user, ids)
+                for pk in ids:
+                    results.append(
+                        {'id': pk, 'status': 'deleted'} if pk in existing
+                        else {'id': pk, 'status': 'not_found',
+                              'errors': missing_error}
+                    )
+                return Response({'results': results})
+            recipes = Recipe.objects.in_bulk(ids)
+            existing = set(relations.values_list('recipe_id', flat=True))
+            added = [pk for pk in recipes if pk not in existing]
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=pk) for pk in added],
+                ignore_conflicts=True
             )
+            # bulk_create не отправляет сигналы, пересчитываем сами
+            if model is Favorite and added:
+                Recipe.objects.filter(pk__in=added).update(
+                    favorites_count=favorites_count_subquery()
+                )
+            if model is Cart and added:
+                refresh_shopping_lists(
+                    [request.user.pk], recipe_ingredient_ids(added)
+                )
+        for pk in ids:
+            if pk not in recipes:
+                results.append({'id': pk, 'status': 'not_found',
+                                'errors': 'Рецепт не найден.'})
+            elif pk in existing:
+                results.append({'id': pk, 'status': 'exists',
+                                'errors': exists_error})
+            else:
+                results.append({'id': pk, 'status': 'added', 'recipe':
+                                RecipeSerializer(
+                                    recipes[pk], context={'request': request}
+                                ).data})
+        return Response({'results': results})
+
+    @action(detail=False, methods=('post', 'delete'),
+            permission_classes=[IsAuthenticated],
+            url_path='favorite', url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        return self.bulk_relation(
+            request, Favorite,
+            'Рецепт уже в избранном.', 'Рецепта нет в избранном.'
         )
 
-        file_list = []
-        for ingredient in ingredients:
-            file_list.append('{} - {} {}.'.format(*ingredient))
+    @action(detail=False, methods=('post', 'delete'),
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart', url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        return self.bulk_relation(
+            request, Cart,
+            'Рецепт уже в списке покупок.', 'Рецепта нет в списке покупок.'
+        )
 
-        file = HttpResponse(
-            'Cписок покупок:\n' + '\n'.join(file_list),
-            content_type='text/plain'
+    @action(detail=False, methods=['get'], pagination_class=CustomPaginator)
+    def match(self, request):
+        """Что приготовить из имеющегося: ?ingredients=1,2,3, рецепты по
+        убыванию доли ингредиентов, которые уже есть."""
+        values = {
+            value for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value
+        }
+        if not values or not all(is_number(value) for value in values):
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов через запятую.'}
+            )
+        if len(values) > settings.RECIPE_MATCHER_MAX_INGREDIENTS:
+            raise ValidationError({'ingredients': (
+                'Не больше '
+                f'{settings.RECIPE_MATCHER_MAX_INGREDIENTS} ингредиентов.'
+            )})
+        page = self.paginate_queryset(
+            recipe_matcher.match(int(value) for value in values)
         )
-        file['Content-Disposition'] = (f'attachment; filename={FILE_NAME}')
+        recipes = Recipe.objects.in_bulk([item['id'] for item in page])
+        matches = []
+        for item in page:
+            recipe = recipes.get(item['id'])
+            if recipe is not None:
+                for name, value in item.items():
+                    setattr(recipe, name, value)
+                matches.append(recipe)
+        serializer = RecipeMatchSerializer(
+            matches, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated], pagination_class=None)
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
 
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_CART_RENDERERS,
+            content_negotiation_class=ShoppingCartContentNegotiation)
+    def download_shopping_cart(self, request, **kwargs):
+        renderer = request.accepted_renderer
+        etag = shopping_cart_etag(request.user, renderer.format)
+        file = get_conditional_response(request, etag=etag)
+        if file is None:
+            file = StreamingHttpResponse(
+                renderer.stream(shopping_cart_ingredients(request.user)),
+                content_type=renderer.get_content_type()
+            )
+            file['Content-Disposition'] = (
+                f'attachment; filename={renderer.get_filename()}'
+            )
+        file['ETag'] = etag
+        patch_cache_control(file, private=True, no_cache=True)
         return file
+
+
+class PerfView(APIView):
+    """Сводка QueryBudgetMiddleware по вьюхам текущего процесса."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        views = {}
+        for record in list(records):
+            key = f'{record["method"]} {record["view"]}'
+            views.setdefault(key, []).append(record)
+        summary = []
+        for key, items in views.items():
+            times = sorted(item['total_ms'] for item in items)
+            summary.append({
+                'view': key,
+                'requests': len(items),
+                'query_budget': items[-1]['query_budget'],
+                'queries_avg': round(
+                    sum(item['queries'] for item in items) / len(items), 2
+                ),
+                'queries_max': max(item['queries'] for item in items),
+                'db_ms_avg': round(
+                    sum(item['db_ms'] for item in items) / len(items), 2
+                ),
+                'serialize_ms_avg': round(
+                    sum(item['serialize_ms'] for item in items) / len(items),
+                    2
+                ),
+                'total_ms_p50': times[len(times) // 2],
+                'total_ms_p95': times[int(len(times) * 0.95)],
+                'size_max': max(item['size'] or 0 for item in items),
+            })
+        return Response({
+            'enabled': settings.PERF_MIDDLEWARE,
+            'views': sorted(summary, key=lambda item: item['view']),
+            'recent': list(records)[-50:],
+        })
@@ -52,6 +52,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# замер запросов к БД и времени ответа по вьюхам, данные — /api/_perf/;
+# PERF_STRICT превращает превышение query_budget вьюхи в ошибку (для тестов)
+PERF_MIDDLEWARE = os.getenv('PERF_MIDDLEWARE', default='False') == 'True'
+PERF_STRICT = os.getenv('PERF_STRICT', default='False') == 'True'
+PERF_BUFFER_SIZE = int(os.getenv('PERF_BUFFER_SIZE', default=1000))
+if PERF_MIDDLEWARE:
+    MIDDLEWARE.append('api.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -90,9 +98,39 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        # постоянные соединения; под ASGI должно быть 0
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', default=60)),
+        # проверка соединения (SELECT 1) перед первым обращением к БД в
+        # запросе, см. api/db.py
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        # нужно при pgbouncer в режиме transaction
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DISABLE_SERVER_SIDE_CURSORS', default='False') == 'True'
+        ),
+    }
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
+# кеш, общий для всех воркеров (в infra — memcached). LocMemCache у каждого
+# процесса свой: сброс версий и журналы из api.cache, api.authentication и
+# api.recipe_matcher другие воркеры не увидят, поэтому без общего кеша
+# кеширование ответов и токенов выключено
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
 
 
 # Password validation
@@ -150,7 +188,10 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # кеш токенов только с общим кешем: иначе отозванный токен
+        # принимали бы другие воркеры
+        'api.authentication.CachedTokenAuthentication' if SHARED_CACHE
+        else 'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -158,13 +199,71 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': [
         'api.pagination.CustomPaginator',
     ],
+    # orjson, если установлен; вернуть стандартный json — заменить на
+    # rest_framework.renderers.JSONRenderer и parsers.JSONParser
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'PAGE_SIZE': 6,
     'SEARCH_PARAM': 'name',
 }
 
 DJOSER = {'LOGIN_FIELD': 'email'}
 
+# сколько секунд токен с пользователем хранится в кеше аутентификации
+# (только при SHARED_CACHE, см. DEFAULT_AUTHENTICATION_CLASSES)
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=60)
+)
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
+# кеш справочников (теги, ингредиенты): хранение в кеше и max-age для
+# браузера и nginx, после которого ответ перепроверяется по ETag
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', default=60))
+
+# сколько хранится общая для всех пользователей часть ответа рецепта
+# (только при SHARED_CACHE: сброс версии в одном воркере другие не увидят)
+RECIPE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_CACHE_TIMEOUT', default=60 * 60 * 24)
+)
+
+# время жизни индекса ингредиентов в памяти воркера, сек
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+
+# конфигурация полнотекстового поиска PostgreSQL и время жизни индекса
+# в памяти, который заменяет его на других СУБД
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', default=300))
+SEARCH_FALLBACK_LIMIT = 500
+
+# через сколько секунд индекс «что приготовить» строится заново; между
+# перестройками изменения рецептов приходят через журнал в кеше, из других
+# воркеров — только при SHARED_CACHE, иначе они отстают до перестройки
+RECIPE_MATCHER_TTL = int(os.getenv('RECIPE_MATCHER_TTL', default=3600))
+RECIPE_MATCHER_MAX_INGREDIENTS = 50
+
+# варианты картинок рецептов: название -> максимальные (ширина, высота)
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (200, 200),
+    'card': (600, 600),
+    'full': (1600, 1600),
+}
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_TIMEOUT = 30
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
 FILE_NAME = 'cart.txt'
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
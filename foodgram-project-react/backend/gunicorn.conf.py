@@ -0,0 +1,53 @@
+"""Настройки gunicorn, читаются автоматически при запуске из /app.
+
+Режим задается переменной GUNICORN_MODE:
+    sync    — процессы без потоков, классический вариант;
+    gthread — меньше процессов, в каждом пул потоков: медленная загрузка
+              картинки занимает поток, а не весь воркер;
+    asgi    — foodgram.asgi под воркерами uvicorn.
+Число воркеров и потоков по умолчанию считается от числа CPU и может быть
+переопределено через GUNICORN_WORKERS и GUNICORN_THREADS.
+"""
+import multiprocessing
+import os
+
+MODES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+mode = os.getenv('GUNICORN_MODE', default='gthread')
+if mode not in MODES:
+    raise RuntimeError(
+        f'GUNICORN_MODE: неизвестный режим {mode}, ожидается один из '
+        f'{", ".join(MODES)}.'
+    )
+cpu_count = multiprocessing.cpu_count()
+
+wsgi_app = (
+    'foodgram.asgi:application' if mode == 'asgi'
+    else 'foodgram.wsgi:application'
+)
+worker_class = MODES[mode]
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    default=2 * cpu_count + 1 if mode == 'sync' else cpu_count + 1
+))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', default=4 if mode == 'gthread' else 1
+))
+
+# больше RECIPE_IMAGE_TIMEOUT, чтобы обработка картинки успевала завершиться
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', default=30))
+# сколько ждать следующего запроса в keep-alive соединении
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+# перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = int(os.getenv(
+    'GUNICORN_MAX_REQUESTS_JITTER', default=100
+))
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG')
+errorlog = '-'
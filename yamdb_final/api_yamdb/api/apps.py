@@ -1,5 +1,12 @@
+import django
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        if django.VERSION < (4, 1):
+            from .db import schedule_health_checks
+            request_started.connect(schedule_health_checks)
@@ -0,0 +1,37 @@
+from functools import wraps
+
+from django.db import connections
+
+
+def check_on_first_cursor(connection):
+    """Оборачивает ensure_connection: проверка выполняется при первом
+    курсоре после начала запроса, как в Django 4.1."""
+    ensure_connection = connection.ensure_connection
+
+    @wraps(ensure_connection)
+    def wrapper():
+        if connection.health_check_pending:
+            connection.health_check_pending = False
+            if (
+                connection.connection is not None
+                and not connection.is_usable()
+            ):
+                connection.close()
+        ensure_connection()
+
+    connection.ensure_connection = wrapper
+
+
+def schedule_health_checks(**kwargs):
+    """Аналог CONN_HEALTH_CHECKS для Django до 4.1.
+
+    При CONN_MAX_AGE > 0 соединение живет между запросами, поэтому перед
+    первым обращением к БД в запросе проверяем его и закрываем, если БД
+    его уже разорвала.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not hasattr(connection, 'health_check_pending'):
+            check_on_first_cursor(connection)
+        connection.health_check_pending = True
@@ -0,0 +1,80 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from titles.models import Title
+from titles.serializers import TitleSerializer
+from titles.views import TitleViewSet
+
+from api.parsers import FastJSONParser, orjson
+from api.renderers import FastJSONRenderer
+
+
+def median(func, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000000)
+    return sorted(timings)[count // 2]
+
+
+class Command(BaseCommand):
+    """Замер JSON-рендерера и парсера на ответах /api/v1/titles/."""
+
+    help = (
+        'Compares DRF JSONRenderer/JSONParser with FastJSONRenderer/'
+        'FastJSONParser on /api/v1/titles/ payloads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--titles', type=int, default=100)
+
+    def get_payloads(self, count):
+        page = TitleViewSet.as_view({'get': 'list'})(
+            APIRequestFactory().get('/api/v1/titles/')
+        ).data
+        if not page['results']:
+            raise CommandError('No titles found, run importcsv first.')
+        titles = TitleSerializer(
+            Title.objects.all()[:count], many=True
+        ).data
+        return {
+            '/api/v1/titles/': page,
+            f'{len(titles)} titles': {'results': titles},
+        }
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson is not installed.')
+        repeat = options['repeat']
+        self.stdout.write(
+            f'{"payload":<20}{"KB":>7}{"render, us":>16}{"parse, us":>16}'
+            f'{"equal":>7}'
+        )
+        for name, data in self.get_payloads(options['titles']).items():
+            content = JSONRenderer().render(data)
+            render = (
+                median(lambda: JSONRenderer().render(data), repeat),
+                median(lambda: FastJSONRenderer().render(data), repeat),
+            )
+            parse = (
+                median(
+                    lambda: JSONParser().parse(io.BytesIO(content)), repeat
+                ),
+                median(
+                    lambda: FastJSONParser().parse(io.BytesIO(content)),
+                    repeat
+                ),
+            )
+            equal = content == FastJSONRenderer().render(data)
+            self.stdout.write(
+                f'{name:<20}{len(content) / 1024:>7.1f}'
+                f'{render[0]:>8.0f}{render[1]:>8.0f}'
+                f'{parse[0]:>8.0f}{parse[1]:>8.0f}'
+                f'{"yes" if equal else "no":>7}'
+            )
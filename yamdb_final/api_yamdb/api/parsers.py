@@ -0,0 +1,35 @@
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSON-парсер на orjson для тел в UTF-8.
+
+    Тело, которое orjson не разобрал, повторно читает JSONParser, чтобы
+    ошибка в ответе была прежней.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (
+            orjson is None
+            or not self.strict
+            or codecs.lookup(encoding).name != 'utf-8'
+        ):
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(content), media_type, parser_context
+            )
@@ -27,7 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'titles',
-    'api',
+    'api.apps.ApiConfig',
     'reviews.apps.ReviewsConfig',
     'users',
     'django_filters',
@@ -82,7 +82,14 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # постоянные соединения вместо нового подключения на каждый запрос
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', default=60)),
+        # проверка соединения (SELECT 1) перед первым обращением к БД в
+        # запросе, см. api/db.py
+        'CONN_HEALTH_CHECKS': os.getenv('CONN_HEALTH_CHECKS', default='True') == 'True',
+        # нужно при pgbouncer в режиме transaction
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DISABLE_SERVER_SIDE_CURSORS', default='False') == 'True',
     }
 }
 
@@ -144,6 +151,16 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 4,
+    # orjson, если установлен, иначе стандартный json
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {